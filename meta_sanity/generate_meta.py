@@ -1,10 +1,12 @@
-import yaml
 import re
-import argparse
 import sys
+import math
+import types
+import functools
 import itertools
 import logging
 from collections import defaultdict
+from decimal import Decimal
 
 # Configure logging to output to console with timestamp
 logging.basicConfig(
@@ -15,25 +17,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ${key} references resolved against the 'keys' section
+_KEY_REF_RE = re.compile(r'\$\{(\w+)\}')
+# item:name references inside iter.combination expressions
+_ITEM_REF_RE = re.compile(r'item:(\w+)')
+# Pattern for ignore-class entries given without a regex
+_MATCH_ALL_RE = re.compile(r'.*')
+# ${...} expressions inside item templates
+_EXPR_RE = re.compile(r'\$\{([^}]*)\}')
+# Built-ins exposed to ${...} template expressions; read-only because every
+# evaluation shares it and expressions can reach it as __builtins__
+_SAFE_BUILTINS = types.MappingProxyType({
+    'str': str,
+    'int': int,
+    'float': float,
+    'abs': abs,
+    'round': round,
+    'len': len,
+})
+
 # Load YAML
 def load_yaml(yaml_path):
-    with open(yaml_path, 'r') as f:
-        return yaml.safe_load(f)
+    # Imported here so library use of generate_meta doesn't pay for PyYAML
+    import yaml
+
+    # Prefer the libyaml-backed loader when PyYAML was built with it
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    # Binary mode lets the loader decode the stream itself
+    with open(yaml_path, 'rb') as f:
+        return yaml.load(f, Loader=loader)
 
 # Resolve ${} references in strings
 def resolve_keys(val, keys):
-    if not isinstance(val, str):
+    if not isinstance(val, str) or '${' not in val:
         return val
-    pattern = re.compile(r'\$\{(\w+)\}')
-    while True:
-        match = pattern.search(val)
-        if not match:
-            break
+
+    def lookup(match):
         key = match.group(1)
         if key not in keys:
             raise ValueError(f"Undefined key: '{key}' referenced in '{val}'")
-        val = val.replace(f"${{{key}}}", keys[key])
-    return val
+        return keys[key]
+
+    # Substitute every reference in one scan; only rescan if a substituted
+    # key value itself introduced further references. Without a cycle every
+    # reference chain ends within len(keys) rescans.
+    original = val
+    for _ in range(len(keys) + 1):
+        if '${' not in val:
+            return val
+        resolved = _KEY_REF_RE.sub(lookup, val)
+        if resolved == val:
+            return val
+        val = resolved
+    raise ValueError(f"Circular key reference while resolving '{original}'")
+
+def expand_keys(keys):
+    """
+    Fully resolve ${} references between keys, visiting keys in dependency order.
+
+    Each key value is substituted exactly once, after every key it references,
+    so the result can be used with resolve_keys without any rescanning.
+
+    Args:
+        keys: Dictionary of raw key values from the 'keys' section
+
+    Returns:
+        dict: Keys in their original order mapped to fully resolved string values
+
+    Raises:
+        ValueError: If a key references an undefined key or keys reference each other in a cycle
+    """
+    dependents = defaultdict(list)
+    pending = {}
+    for key, value in keys.items():
+        refs = set(_KEY_REF_RE.findall(value)) if isinstance(value, str) else set()
+        for ref in refs:
+            if ref not in keys:
+                raise ValueError(f"Undefined key: '{ref}' referenced in '{value}'")
+            dependents[ref].append(key)
+        pending[key] = len(refs)
+
+    # Kahn's algorithm: a key is ready once all keys it references are resolved
+    expanded = {}
+    ready = [key for key, count in pending.items() if count == 0]
+    while ready:
+        key = ready.pop()
+        value = keys[key]
+        if isinstance(value, str):
+            value = _KEY_REF_RE.sub(lambda match: expanded[match.group(1)], value)
+        expanded[key] = normalize_value(value)
+        for dependent in dependents[key]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0:
+                ready.append(dependent)
+
+    if len(expanded) != len(keys):
+        cyclic = [key for key in keys if key not in expanded]
+        raise ValueError(f"Circular key reference between keys: {cyclic}")
+    return {key: expanded[key] for key in keys}
 
 def process_ignore_class(ignore_class):
     if not ignore_class:
@@ -42,19 +123,56 @@ def process_ignore_class(ignore_class):
     for ignore_class_item in ignore_class:
         if ":" not in ignore_class_item:
             logger.warning(f"Will ignore all instances of class '{ignore_class_item}'")
-            ignore_class_dict[ignore_class_item] = ".*"
+            ignore_class_dict[ignore_class_item] = _MATCH_ALL_RE
         else:
             class_name, regex_pattern = ignore_class_item.split(':', 1)
             if class_name in ignore_class_dict:
                 raise ValueError(f"Duplicate ignore class: '{class_name}'")
-            ignore_class_dict[class_name] = regex_pattern
+            # Compile once here rather than on every instance checked
+            try:
+                ignore_class_dict[class_name] = re.compile(regex_pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid regex pattern '{regex_pattern}' for ignore class '{class_name}': {e}")
     return ignore_class_dict
 
+def intern_name(name):
+    """Intern string names so repeated dict lookups on them compare by identity."""
+    return sys.intern(name) if type(name) is str else name
+
 def should_ignore_class(class_name, instance_name, ignore_class_dict):
     if class_name in ignore_class_dict:
-        return re.match(ignore_class_dict[class_name], instance_name)
+        return ignore_class_dict[class_name].match(instance_name)
     return False
 
+def ignores_whole_class(class_name, ignore_class_dict):
+    # Bare class names (and '.*' patterns) match every instance, so templates
+    # of that class can be skipped without expanding any names
+    pattern = ignore_class_dict.get(class_name)
+    return pattern is not None and pattern.pattern == '.*'
+
+def _normalize_none(value):
+    return "null"
+
+def _normalize_bool(value):
+    # YAML treats 'true'/'false' as booleans, so we preserve that
+    return "true" if value else "false"
+
+def _normalize_float(value):
+    # Preserve int format when possible
+    whole = int(value)
+    if whole == value:
+        return str(whole)
+    return repr(value)
+
+# Normalizers for exact built-in types; subclasses go through the checks in
+# normalize_value
+_VALUE_NORMALIZERS = {
+    type(None): _normalize_none,
+    bool: _normalize_bool,
+    int: str,
+    float: _normalize_float,
+}
+
 def normalize_value(value):
     """
     Normalize values to strings for meta file output.
@@ -66,12 +184,15 @@ def normalize_value(value):
     Returns:
         str: Normalized string representation
     """
-    if value is None:
-        return "null"
-    elif isinstance(value, bool):
-        # YAML treats 'true'/'false' as booleans, so we preserve that
-        return "true" if value else "false"
-    elif isinstance(value, (int, float)):
+    value_type = type(value)
+    if value_type is str:
+        return value
+    normalizer = _VALUE_NORMALIZERS.get(value_type)
+    if normalizer is not None:
+        return normalizer(value)
+
+    # bool cannot be subclassed, so only int/float/str subclasses get here
+    if isinstance(value, (int, float)):
         # Convert numbers to strings, preserving int format when possible
         if isinstance(value, float) and value == int(value):
             return str(int(value))
@@ -119,6 +240,62 @@ def validate_nested_field(template_name, template_def, parent_field, nested_fiel
     if nested_field not in template_def[parent_field]:
         raise ValueError(f"Template '{template_name}' is missing '{nested_field}' in '{parent_field}'")
 
+def get_template_parent(template_name, template_def):
+    """
+    Get the parent(s) of a template from either 'parent' or 'pattern.parent'.
+
+    Args:
+        template_name: Name of the template
+        template_def: Template definition dictionary
+
+    Returns:
+        The parent value (string, list, or None)
+
+    Raises:
+        ValueError: If both parent locations are specified
+    """
+    pattern_parent = template_def.get('pattern', {}).get('parent')
+    top_parent = template_def.get('parent')
+    if pattern_parent and top_parent:
+        raise ValueError(f"Template '{template_name}' specifies both 'parent' and 'pattern.parent'; use only one.")
+    return pattern_parent or top_parent
+
+def iter_parents(parent):
+    """
+    Normalize a parent value to an iterable of parent names.
+
+    Args:
+        parent: A single parent name, a list of names, or None
+
+    Returns:
+        A one-element tuple for a single name, an empty tuple for None,
+        otherwise the value itself (no copy is made)
+    """
+    if isinstance(parent, str):
+        return (parent,)
+    if parent is None:
+        return ()
+    return parent
+
+@functools.lru_cache(maxsize=1024)
+def _compile_expr(expr):
+    # Template expressions repeat for every item, so compile each source once
+    return compile(expr, '<template>', 'eval')
+
+def _eval_item_expr(expr, item):
+    """Evaluate a single ${...} expression body against 'item'."""
+    if expr == 'item':
+        # Simple replacement - normalize the value to string
+        return normalize_value(item)
+    # Evaluate Python expression
+    # For safety, provide limited context with safe built-ins
+    try:
+        safe_namespace = {'__builtins__': _SAFE_BUILTINS, 'item': item}
+        value = eval(_compile_expr(expr), safe_namespace)
+        return normalize_value(value)
+    except Exception as e:
+        raise ValueError(f"Failed to evaluate expression '${{'{expr}'}}' with item={repr(item)}: {e}")
+
 def process_template_expr(template: str, item) -> str:
     """Process template expressions containing 'item' variable.
 
@@ -134,53 +311,246 @@ def process_template_expr(template: str, item) -> str:
     """
     if not isinstance(template, str):
         raise ValueError(f"Template must be a string, got {type(template).__name__}: {template}")
+    if '${' not in template:
+        return template
+
+    literals, exprs, unclosed = _parse_item_template(template)
+    parts = [literals[0]]
+    for expr, literal in zip(exprs, literals[1:]):
+        parts.append(_eval_item_expr(expr, item))
+        parts.append(literal)
+    if unclosed:
+        raise ValueError(f"Unclosed ${{}} expression in template: {template}")
+    return ''.join(parts)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_item_template(template):
+    # Split around the ${...} expressions that reference 'item'; others stay
+    # in the literal text. Substituted values are never rescanned.
+    literals = []
+    exprs = []
+    pos = 0
+    for match in _EXPR_RE.finditer(template):
+        expr = match.group(1)
+        # Only process if expression contains 'item' variable
+        if 'item' not in expr:
+            continue
+        literals.append(template[pos:match.start()])
+        exprs.append(expr)
+        pos = match.end()
+    literals.append(template[pos:])
+    unclosed = template.find('${', template.rfind('}') + 1) != -1
+    return tuple(literals), tuple(exprs), unclosed
+
+def bind_keys(template, keys, item_marker='item'):
+    """
+    Substitute key references in a template before it is expanded per item.
+
+    Property templates usually mix keys and item references (e.g.
+    '${data_dir}/${item}.csv'). Binding the keys once lets the template take the
+    split-and-join fast path, so resolving keys after expansion finds nothing
+    left to do. Only ${key} references whose values contain no '$', '{' or '}'
+    are bound, which keeps the result identical to expanding first and resolving
+    keys afterwards.
+
+    Args:
+        template: Template string (other values are returned unchanged)
+        keys: Fully resolved keys, as returned by expand_keys
+        item_marker: Substring that makes an expression an item expression
+            ('item:' for iter.combination templates)
+
+    Returns:
+        The template with bindable key references substituted. Templates that
+        reference an undefined key or contain an unclosed expression are returned
+        unchanged so the later error messages still show the original template.
+    """
+    if not isinstance(template, str) or '${' not in template:
+        return template
+    if template.find('${', template.rfind('}') + 1) != -1:
+        return template
+    for ref in _KEY_REF_RE.findall(template):
+        if ref not in keys and item_marker not in ref:
+            return template
+
+    def bind(match):
+        expr = match.group(1)
+        value = keys.get(expr)
+        if value is None or item_marker in expr or not _KEY_REF_RE.fullmatch(match.group(0)):
+            return match.group(0)
+        if '$' in value or '{' in value or '}' in value:
+            return match.group(0)
+        return value
 
-    result = template
-    # Process all ${...} expressions that contain 'item'
+    return _EXPR_RE.sub(bind, template)
+
+def split_item_template(template):
+    """
+    Split a template whose only expressions are bare ${item} references.
+
+    Such templates (e.g. 'sample__${item}') are expanded by joining the chunks
+    with the normalized item, skipping expression scanning and evaluation.
+
+    Args:
+        template: Template string
+
+    Returns:
+        tuple: Literal chunks around each ${item}, or None if the template is not
+        a string or contains any other ${...} expression
+    """
+    if not isinstance(template, str):
+        return None
+    return _split_item_template(template)
+
+# Compiled template forms are pure functions of the template string, so they
+# are cached across templates and generate_meta calls
+@functools.lru_cache(maxsize=4096)
+def _split_item_template(template):
+    chunks = tuple(template.split('${item}'))
+    if any('${' in chunk for chunk in chunks):
+        return None
+    return chunks
+
+def expand_item_template(template, chunks, item):
+    """
+    Expand a template for one item, using its split chunks when available.
+
+    Args:
+        template: Template string
+        chunks: Result of split_item_template(template)
+        item: The item value to substitute
+
+    Returns:
+        str: The expanded template
+    """
+    if chunks is None:
+        return process_template_expr(template, item)
+    if len(chunks) == 1:
+        return chunks[0]
+    return normalize_value(item).join(chunks)
+
+def compile_combination_template(template: str) -> tuple:
+    """Split a template into literal text and 'item:name' expression segments.
+
+    The result can be bound with bind_combination_template and rendered
+    repeatedly with render_combination_values, so a template only has to be
+    scanned once rather than once per combination. Results are cached by
+    template string.
+
+    Args:
+        template: String containing ${...} expressions that reference 'item:name'
+    Returns:
+        Tuple of segments; literal text is kept as a str, a simple ${item:name}
+        reference becomes (expr, name, None) and any other expression becomes
+        (expr, None, (eval_expr, names))
+    Raises:
+        ValueError: If the template is not a string or has an unclosed expression
+    """
+    if not isinstance(template, str):
+        raise ValueError(f"Template must be a string, got {type(template).__name__}: {template}")
+    return _compile_combination_template(template)
+
+@functools.lru_cache(maxsize=4096)
+def _compile_combination_template(template):
+    segments = []
+    literal_start = 0
     pos = 0
     while True:
-        start = result.find('${', pos)
+        start = template.find('${', pos)
         if start == -1:
             break
-        end = result.find('}', start)
+        end = template.find('}', start)
         if end == -1:
             raise ValueError(f"Unclosed ${{}} expression in template: {template}")
-        expr = result[start+2:end]
+        expr = template[start+2:end]
+        pos = end + 1
 
-        # Only process if expression contains 'item' variable
-        if 'item' not in expr:
-            # Skip this expression, it doesn't reference item
-            # Move past it and continue
-            pos = end + 1
+        # Expressions without 'item:' references are left as literal text
+        if 'item:' not in expr:
             continue
 
-        if expr == 'item':
-            # Simple replacement - normalize the value to string
-            value = normalize_value(item)
+        if start > literal_start:
+            segments.append(template[literal_start:start])
+        literal_start = pos
+
+        simple_match = _ITEM_REF_RE.fullmatch(expr)
+        if simple_match:
+            segments.append((expr, simple_match.group(1), None))
         else:
-            # Evaluate Python expression
-            # For safety, provide limited context with safe built-ins
-            try:
-                safe_namespace = {
-                    '__builtins__': {
-                        'str': str,
-                        'int': int,
-                        'float': float,
-                        'abs': abs,
-                        'round': round,
-                        'len': len,
-                    },
-                    'item': item,
-                }
-                value = eval(expr, safe_namespace)
-                value = normalize_value(value)
-            except Exception as e:
-                raise ValueError(f"Failed to evaluate expression '${{'{expr}'}}' with item={repr(item)}: {e}")
-        result = result[:start] + value + result[end+1:]
-        # Continue searching from where we just inserted the value
-        pos = start + len(value)
-
-    return result
+            # Replace item:name references with safe variable names for evaluation
+            names = tuple(dict.fromkeys(_ITEM_REF_RE.findall(expr)))
+            eval_expr = _ITEM_REF_RE.sub(r'_item_\1', expr)
+            segments.append((expr, None, (eval_expr, names)))
+
+    if literal_start < len(template):
+        segments.append(template[literal_start:])
+    return tuple(segments)
+
+def bind_combination_template(segments: tuple, names) -> tuple:
+    """Bind item:name references in compiled segments to input positions.
+
+    iter.combination renders bound segments straight from the tuples produced by
+    itertools.product, so no item dictionary is built per combination. When a
+    name is repeated, the last input with that name wins, as in a dict.
+
+    Args:
+        segments: Segments from compile_combination_template
+        names: Input names, in the order of the values being rendered
+    Returns:
+        tuple: Segments for render_combination_values
+    """
+    positions = {name: idx for idx, name in enumerate(names)}
+    bound = []
+    for segment in segments:
+        if isinstance(segment, str):
+            bound.append(segment)
+            continue
+        expr, name, compiled = segment
+        if name is not None:
+            # Unknown names are reported when rendering, like unbound segments
+            bound.append((expr, positions.get(name), None))
+            continue
+        eval_expr, refs = compiled
+        # Unknown names stay unbound so evaluation reports them
+        variables = tuple((f'_item_{ref}', positions[ref]) for ref in refs if ref in positions)
+        bound.append((expr, None, (eval_expr, variables)))
+    return tuple(bound)
+
+def render_combination_values(segments: tuple, names, values) -> str:
+    """Render segments from bind_combination_template for one combination.
+
+    Args:
+        segments: Bound template segments
+        names: Input names the segments were bound to
+        values: Values for one combination, in the same order as names
+    Returns:
+        Processed string with all expressions evaluated
+    Raises:
+        ValueError: If a reference is unknown or evaluation fails
+    """
+    parts = []
+    for segment in segments:
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        expr, idx, compiled = segment
+        if compiled is None:
+            # Simple replacement - normalize the value to string
+            if idx is None:
+                name = _ITEM_REF_RE.fullmatch(expr).group(1)
+                raise ValueError(f"Unknown item reference 'item:{name}' in expression '${{'{expr}'}}'. Available items: {list(dict.fromkeys(names))}")
+            parts.append(normalize_value(values[idx]))
+            continue
+
+        eval_expr, variables = compiled
+        try:
+            safe_namespace = {'__builtins__': _SAFE_BUILTINS}
+            for var, var_idx in variables:
+                safe_namespace[var] = values[var_idx]
+            value = eval(_compile_expr(eval_expr), safe_namespace)
+            parts.append(normalize_value(value))
+        except Exception as e:
+            raise ValueError(f"Failed to evaluate expression '${{'{expr}'}}' with items={dict(zip(names, values))}: {e}")
+    return ''.join(parts)
 
 def process_combination_expr(template: str, item_dict: dict) -> str:
     """Process template expressions containing named 'item:name' references.
@@ -196,94 +566,174 @@ def process_combination_expr(template: str, item_dict: dict) -> str:
     Raises:
         ValueError: If expression is invalid or evaluation fails
     """
-    if not isinstance(template, str):
-        raise ValueError(f"Template must be a string, got {type(template).__name__}: {template}")
+    names = tuple(item_dict)
+    segments = bind_combination_template(compile_combination_template(template), names)
+    return render_combination_values(segments, names, tuple(item_dict.values()))
 
-    result = template
-    # Process all ${...} expressions
-    pos = 0
-    while True:
-        start = result.find('${', pos)
-        if start == -1:
-            break
-        end = result.find('}', start)
-        if end == -1:
-            raise ValueError(f"Unclosed ${{}} expression in template: {template}")
-        expr = result[start+2:end]
+def range_values(start: float, end: float, inc: float) -> list:
+    """
+    Generate the values of an inclusive numeric range.
 
-        # Check if expression contains 'item:' references
-        if 'item:' not in expr:
-            # Skip this expression, it doesn't reference item:name
-            pos = end + 1
-            continue
+    Whole-number start and inc use an integer range. Otherwise the number of
+    steps is computed up front and each value is derived from its index in
+    decimal arithmetic, so float increments such as 0.1 neither accumulate
+    error nor drop the final value, and no precision is lost for very small
+    increments or long decimals.
 
-        # Check if it's a simple item:name reference
-        simple_match = re.match(r'^item:(\w+)$', expr)
-        if simple_match:
-            # Simple replacement - normalize the value to string
-            name = simple_match.group(1)
-            if name not in item_dict:
-                raise ValueError(f"Unknown item reference 'item:{name}' in expression '${{'{expr}'}}'. Available items: {list(item_dict.keys())}")
-            value = normalize_value(item_dict[name])
+    Args:
+        start: First value
+        end: Last value (inclusive)
+        inc: Step between values, non-zero and pointing from start to end
+
+    Returns:
+        list: Range values, with whole numbers converted to int
+    """
+    if float(start).is_integer() and float(inc).is_integer():
+        # Exact already, and much cheaper than decimal arithmetic per value
+        if inc > 0:
+            stop = math.floor(end) + 1
         else:
-            # Expression with item:name references - need to substitute and evaluate
-            # First, replace all item:name references with placeholder variable names
-            eval_expr = expr
-            local_vars = {}
-            for name, val in item_dict.items():
-                pattern = f'item:{name}'
-                if pattern in eval_expr:
-                    # Use a safe variable name for evaluation
-                    var_name = f'_item_{name}'
-                    eval_expr = eval_expr.replace(pattern, var_name)
-                    local_vars[var_name] = val
-
-            # Evaluate the expression
-            try:
-                safe_namespace = {
-                    '__builtins__': {
-                        'str': str,
-                        'int': int,
-                        'float': float,
-                        'abs': abs,
-                        'round': round,
-                        'len': len,
-                    },
-                }
-                safe_namespace.update(local_vars)
-                value = eval(eval_expr, safe_namespace)
-                value = normalize_value(value)
-            except Exception as e:
-                raise ValueError(f"Failed to evaluate expression '${{'{expr}'}}' with items={item_dict}: {e}")
-
-        result = result[:start] + value + result[end+1:]
-        # Continue searching from where we just inserted the value
-        pos = start + len(value)
-
-    return result
+            stop = math.ceil(end) - 1
+        return list(range(int(start), stop, int(inc)))
+
+    # Work in decimal so each value is exactly start + idx * inc as written,
+    # e.g. 0.1 + 2 * 0.1 is 0.3 rather than 0.30000000000000004
+    start_dec = Decimal(repr(start))
+    inc_dec = Decimal(repr(inc))
+    count = max(math.floor((Decimal(repr(end)) - start_dec) / inc_dec) + 1, 0)
+    values = []
+    for idx in range(count):
+        value = start_dec + idx * inc_dec
+        values.append(int(value) if value == value.to_integral_value() else float(value))
+    return values
 
 # Main meta-generation function
-def generate_meta(yaml_cfg, ignore_class=None):
+def generate_meta(yaml_cfg, ignore_class=None, out=None):
+    """
+    Generate meta file content from a parsed YAML config.
+
+    Args:
+        yaml_cfg: Parsed configuration dictionary
+        ignore_class: Optional list of '{class_name}' or '{class_name}:{regex}' filters
+        out: Optional writable text stream; when given, lines are written to it
+            directly instead of being joined into one string
+
+    Returns:
+        str: The meta file content, or None if it was written to 'out'
+    """
+    all_lines = build_meta_lines(yaml_cfg, ignore_class)
+    if out is None:
+        return "\n".join(all_lines)
+    write_meta_lines(all_lines, out)
+    return None
+
+def write_meta_lines(all_lines, out):
+    """Write lines from build_meta_lines to a text stream, newline-separated."""
+    all_lines = iter(all_lines)
+    out.write(next(all_lines))
+    for line in all_lines:
+        out.write("\n")
+        out.write(line)
+
+def build_meta_lines(yaml_cfg, ignore_class=None):
+    """
+    Build every meta file line from a parsed YAML config.
+
+    All blocks are built before this returns, so config errors are raised
+    before the caller writes anything.
+
+    Args:
+        yaml_cfg: Parsed configuration dictionary
+        ignore_class: Optional list of '{class_name}' or '{class_name}:{regex}' filters
+
+    Returns:
+        iterator: Meta file lines, without trailing newlines
+    """
     lines = [f"!config {yaml_cfg['config']}"]
-    keys = yaml_cfg.get('keys', {})
+    # Keys are resolved against each other once up front, so substituting
+    # them into values later never needs a second pass
+    keys = expand_keys(yaml_cfg.get('keys', {}))
+
+    # Keys are fixed for the rest of the run, so identical values (e.g. a
+    # static property repeated for every template item) resolve only once
+    @functools.lru_cache(maxsize=None)
+    def resolve_cached(val):
+        return resolve_keys(val, keys)
+
+    def resolve(val):
+        # Values without references (most per-item values) skip the cache
+        if '${' not in val:
+            return val
+        return resolve_cached(val)
+
     ignore_class_dict = process_ignore_class(ignore_class)
 
     # Write keys
     for k, v in keys.items():
-        resolved_v = resolve_keys(v, keys)
-        lines.append(f"!key {k} {normalize_value(resolved_v)}")
+        lines.append(f"!key {k} {v}")
 
     classes = yaml_cfg.get('classes', {})
     subset_map = {}
 
     all_classes = {}
-    all_parents = defaultdict(set)
-    all_instance_properties = defaultdict(lambda: {})
-    class_last_line_idx = {}
+    # Reverse index: class -> instances (dict used as an ordered set)
+    instances_by_class = defaultdict(dict)
+
+    # Classes that gained a re-registered instance; their index is rebuilt
+    # from all_classes on the next lookup
+    reordered_classes = set()
+
+    def register_instance(name, cls):
+        previous = all_classes.get(name)
+        if previous is not None and previous != cls:
+            instances_by_class[previous].pop(name, None)
+            reordered_classes.add(cls)
+        all_classes[name] = cls
+        instances_by_class[cls][name] = None
+
+    def class_instances(cls):
+        # Instances keep the position of their first registration, even when
+        # they were later registered under another class
+        if cls in reordered_classes:
+            reordered_classes.discard(cls)
+            instances_by_class[cls] = dict.fromkeys(name for name, name_cls in all_classes.items() if name_cls == cls)
+        return list(instances_by_class.get(cls, ()))
+
+    all_parents = {}
+    all_instance_properties = defaultdict(dict)
+    # Each emitted instance gets its own line buffer so later duplicates can
+    # append parents/properties to it without shifting one global list
+    blocks = []
+    instance_lines = {}
+
+    def start_block(name, cls):
+        block = [f"\n{name} class {cls}"]
+        blocks.append(block)
+        instance_lines[name] = block
+        all_parents[name] = set()
+        return block
+
+    def warn_duplicates(tmpl_name, tmpl_class, duplicate_names, new_property_count):
+        # One summary per template rather than a warning per duplicate item
+        if not duplicate_names:
+            return
+        examples = ', '.join(f"'{name}'" for name in duplicate_names[:5])
+        if len(duplicate_names) > 5:
+            examples += f" and {len(duplicate_names) - 5} more"
+        logger.warning(f"Template '{tmpl_name}' produced {len(duplicate_names)} duplicate instance name(s) with class '{tmpl_class}' ({examples}), added new parents and {new_property_count} new property value(s) to the existing instances")
+
+    def add_parent(name, block, p):
+        # Skip parents the instance already has, e.g. re-added by a duplicate
+        seen = all_parents[name]
+        if p not in seen:
+            seen.add(p)
+            block.append(f"{name} parent {p}")
 
     root_class_count = 0
     for cname, cdef in classes.items():
-        if should_ignore_class(cdef['class'], cname, ignore_class_dict):
+        cname = intern_name(cname)
+        class_type = intern_name(cdef['class'])
+        if should_ignore_class(class_type, cname, ignore_class_dict):
             continue
         parent = cdef.get('parent')
         if parent in [None, 'null']:
@@ -291,21 +741,18 @@ def generate_meta(yaml_cfg, ignore_class=None):
             if root_class_count > 1:
                 raise ValueError(f"Multiple root classes found: '{cname}' is an additional root class")
 
-        lines.append(f"\n{cname} class {cdef['class']}")
-        all_classes[cname] = cdef['class']
+        block = start_block(cname, class_type)
+        register_instance(cname, class_type)
         if parent not in [None, 'null']:
-            if isinstance(parent, str):
-                parent = [parent]
-            for p in parent:
-                lines.append(f"{cname} parent {p}")
-                all_parents[cname].add(p)
+            for p in iter_parents(parent):
+                add_parent(cname, block, intern_name(p))
         elif root_class_count == 0:
             raise ValueError(f"Class '{cname}' must specify a parent unless it's explicitly the single root class")
         for pk, pv in cdef.get('properties', {}).items():
-            resolved_pv = resolve_keys(normalize_value(pv), keys)
-            lines.append(f"{cname} {pk} {resolved_pv}")
+            pk = intern_name(pk)
+            resolved_pv = resolve(normalize_value(pv))
+            block.append(f"{cname} {pk} {resolved_pv}")
             all_instance_properties[cname][pk] = resolved_pv
-        class_last_line_idx[cname] = len(lines)
         # Add class to subsets if specified
         for subset in cdef.get('subsets', []):
             subset_map.setdefault(subset, []).append(cname)
@@ -318,13 +765,6 @@ def generate_meta(yaml_cfg, ignore_class=None):
             if not operation:
                 raise ValueError(f"Template '{tmpl_name}' is missing required field 'operation'")
 
-            def get_template_parent():
-                pattern_parent = tmpl.get('pattern', {}).get('parent')
-                top_parent = tmpl.get('parent')
-                if pattern_parent and top_parent:
-                    raise ValueError(f"Template '{tmpl_name}' specifies both 'parent' and 'pattern.parent'; use only one.")
-                return pattern_parent or top_parent
-
             if operation == 'for_each_item':
                 validate_template_input(tmpl_name, tmpl, ['input', 'pattern', 'class'])
                 validate_nested_field(tmpl_name, tmpl, 'pattern', 'name')
@@ -332,55 +772,55 @@ def generate_meta(yaml_cfg, ignore_class=None):
                 if not isinstance(tmpl['input'], list):
                     raise ValueError(f"Template '{tmpl_name}' field 'input' must be a list, got {type(tmpl['input']).__name__}")
 
-                parent = get_template_parent()
-                if isinstance(parent, str):
-                    parent = [parent]
+                # Template fields are invariant across items, look them up once
+                tmpl_class = intern_name(tmpl['class'])
+                if ignores_whole_class(tmpl_class, ignore_class_dict):
+                    continue
+                pattern_name = tmpl['pattern']['name']
+                name_chunks = split_item_template(pattern_name)
+                prop_items = []
+                for prop_key, prop_val in tmpl['pattern'].get('properties', {}).items():
+                    prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
+                    prop_val_str = bind_keys(prop_val_str, keys)
+                    prop_items.append((intern_name(prop_key), prop_val_str, split_item_template(prop_val_str)))
+                subset_lists = [subset_map.setdefault(subset, []) for subset in tmpl.get('subsets', [])]
+                parent = tuple(intern_name(p) for p in iter_parents(get_template_parent(tmpl_name, tmpl)))
+                duplicate_names = []
+                new_property_count = 0
                 for idx, item in enumerate(tmpl['input']):
                     try:
-                        instance_name = process_template_expr(tmpl['pattern']['name'], item)
+                        instance_name = intern_name(expand_item_template(pattern_name, name_chunks, item))
                     except Exception as e:
                         raise ValueError(f"Template '{tmpl_name}' failed to process item at index {idx} (value={repr(item)}): {e}")
-                    if should_ignore_class(tmpl['class'], instance_name, ignore_class_dict):
+                    if should_ignore_class(tmpl_class, instance_name, ignore_class_dict):
                         continue
                     # Check if the instance name already exists and is the same class (if so, it'll just try to add new parents)
                     is_duplicate = False
-                    if instance_name in all_classes and all_classes[instance_name] == tmpl['class']:
+                    if instance_name in all_classes and all_classes[instance_name] == tmpl_class:
                         is_duplicate = True
-                        logger.warning(f"Duplicate instance name: '{instance_name}' with class '{tmpl['class']}', will attempt to add new parents")
+                        duplicate_names.append(instance_name)
+                        block = instance_lines[instance_name]
                     else:
-                        lines.append(f"\n{instance_name} class {tmpl['class']}")
-                    if parent:
-                        for p in parent:
-                            if is_duplicate:
-                                lines.insert(class_last_line_idx[instance_name], f"{instance_name} parent {p}")
-                                # Update the class last line index
-                                class_last_line_idx[instance_name] += 1
-                            else:
-                                lines.append(f"{instance_name} parent {p}")
-                            all_parents[instance_name].add(p)
-                    if 'properties' in tmpl['pattern']:
-                        for prop_key, prop_val in tmpl['pattern']['properties'].items():
-                            try:
-                                prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
-                                resolved_val = resolve_keys(process_template_expr(prop_val_str, item), keys)
-                            except Exception as e:
-                                raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}' for item {repr(item)}: {e}")
-                            if is_duplicate:
-                                if prop_key in all_instance_properties[instance_name] and all_instance_properties[instance_name][prop_key] == resolved_val:
-                                    continue
-                                else:
-                                    logger.warning(f"Duplicate instance name: '{instance_name}' with class '{tmpl['class']}', will attempt to add new property")
-                                    lines.insert(class_last_line_idx[instance_name], f"{instance_name} {prop_key} {resolved_val}")
-                                    # Update the class last line index
-                                    class_last_line_idx[instance_name] += 1
-                                    continue
-                            lines.append(f"{instance_name} {prop_key} {resolved_val}")
-                            all_instance_properties[instance_name][prop_key] = resolved_val
-                    if not is_duplicate:
-                        class_last_line_idx[instance_name] = len(lines)
-                    for subset in tmpl.get('subsets', []):
-                        subset_map.setdefault(subset, []).append(instance_name)
-                    all_classes[instance_name] = tmpl['class']
+                        block = start_block(instance_name, tmpl_class)
+                    for p in parent:
+                        add_parent(instance_name, block, p)
+                    instance_properties = all_instance_properties[instance_name]
+                    for prop_key, prop_val_str, prop_chunks in prop_items:
+                        try:
+                            resolved_val = resolve(expand_item_template(prop_val_str, prop_chunks, item))
+                        except Exception as e:
+                            raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}' for item {repr(item)}: {e}")
+                        if is_duplicate:
+                            if instance_properties.get(prop_key) != resolved_val:
+                                new_property_count += 1
+                                block.append(f"{instance_name} {prop_key} {resolved_val}")
+                            continue
+                        block.append(f"{instance_name} {prop_key} {resolved_val}")
+                        instance_properties[prop_key] = resolved_val
+                    for subset_list in subset_lists:
+                        subset_list.append(instance_name)
+                    register_instance(instance_name, tmpl_class)
+                warn_duplicates(tmpl_name, tmpl_class, duplicate_names, new_property_count)
 
             elif operation == 'for_each_class':
                 validate_template_input(tmpl_name, tmpl, ['input', 'pattern', 'class'])
@@ -392,43 +832,51 @@ def generate_meta(yaml_cfg, ignore_class=None):
                 if 'class_name' not in tmpl['input']:
                     raise ValueError(f"Template '{tmpl_name}' with operation 'for_each_class' is missing 'class_name' in 'input'")
 
-                prefix = tmpl.get('prefix', '')
-                parent = get_template_parent()
-                if isinstance(parent, str):
-                    parent = [parent]
+                tmpl_class = intern_name(tmpl['class'])
+                if ignores_whole_class(tmpl_class, ignore_class_dict):
+                    continue
+                pattern_name = tmpl['pattern']['name']
+                if isinstance(pattern_name, str):
+                    pattern_name = pattern_name.replace("${prefix}", tmpl.get('prefix', ''))
+                name_chunks = split_item_template(pattern_name)
+                prop_items = []
+                for prop_key, prop_val in tmpl['pattern']['properties'].items():
+                    prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
+                    prop_val_str = bind_keys(prop_val_str, keys)
+                    prop_items.append((intern_name(prop_key), prop_val_str, split_item_template(prop_val_str)))
+                subset_lists = [subset_map.setdefault(subset, []) for subset in tmpl.get('subsets', [])]
+                parent = tuple(intern_name(p) for p in iter_parents(get_template_parent(tmpl_name, tmpl)))
                 subset_filter = tmpl['input'].get('if_subset', None)
                 items = []
                 if subset_filter:
                     for subset in subset_filter:
                         items.extend(subset_map.get(subset, []))
                 else:
-                    items = [item for item in all_classes.keys() if all_classes[item] == tmpl['input']['class_name']]
+                    items = class_instances(tmpl['input']['class_name'])
 
                 if not items:
                     logger.warning(f"Template '{tmpl_name}' with operation 'for_each_class' found no instances of class '{tmpl['input']['class_name']}'{' with subset filter ' + str(subset_filter) if subset_filter else ''}")
 
                 for item in items:
                     try:
-                        instance_name = process_template_expr(tmpl['pattern']['name'].replace("${prefix}", prefix), item)
+                        instance_name = intern_name(expand_item_template(pattern_name, name_chunks, item))
                     except Exception as e:
                         raise ValueError(f"Template '{tmpl_name}' failed to process class instance '{item}': {e}")
 
-                    if should_ignore_class(tmpl['class'], instance_name, ignore_class_dict):
+                    if should_ignore_class(tmpl_class, instance_name, ignore_class_dict):
                         continue
-                    lines.append(f"\n{instance_name} class {tmpl['class']}")
-                    all_classes[instance_name] = tmpl['class']
-                    if parent:
-                        for p in parent:
-                            lines.append(f"{instance_name} parent {p}")
-                    for prop_key, prop_val in tmpl['pattern']['properties'].items():
+                    block = start_block(instance_name, tmpl_class)
+                    register_instance(instance_name, tmpl_class)
+                    for p in parent:
+                        add_parent(instance_name, block, p)
+                    for prop_key, prop_val_str, prop_chunks in prop_items:
                         try:
-                            prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
-                            resolved_val = resolve_keys(process_template_expr(prop_val_str, item), keys)
+                            resolved_val = resolve(expand_item_template(prop_val_str, prop_chunks, item))
                         except Exception as e:
                             raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}' for item '{item}': {e}")
-                        lines.append(f"{instance_name} {prop_key} {resolved_val}")
-                    for subset in tmpl.get('subsets', []):
-                        subset_map.setdefault(subset, []).append(instance_name)
+                        block.append(f"{instance_name} {prop_key} {resolved_val}")
+                    for subset_list in subset_lists:
+                        subset_list.append(instance_name)
 
             elif operation == 'iter.combination':
                 validate_template_input(tmpl_name, tmpl, ['input', 'pattern', 'class'])
@@ -441,7 +889,6 @@ def generate_meta(yaml_cfg, ignore_class=None):
 
                 input_sets = []
                 names = []
-                prefix = tmpl.get('prefix', '')
                 for input_spec in tmpl['input']:
                     if 'name' not in input_spec:
                         raise ValueError(f"Template '{tmpl_name}' with operation 'iter.combination' has input spec missing 'name' field")
@@ -457,7 +904,7 @@ def generate_meta(yaml_cfg, ignore_class=None):
                                 items.extend(subset_map.get(subset, []))
                         else:
                             # If no subset filter, get all items that match the class name
-                            items = [item for item in all_classes.keys() if all_classes[item] == input_spec['class_name']]
+                            items = class_instances(input_spec['class_name'])
                         if not items:
                             logger.warning(f"Template '{tmpl_name}' with operation 'iter.combination' found no instances of class '{input_spec['class_name']}' for input '{name}'{' with subset filter ' + str(subset_filter) if subset_filter else ''}")
                         input_sets.append(items)
@@ -488,61 +935,75 @@ def generate_meta(yaml_cfg, ignore_class=None):
                             raise ValueError(f"Template '{tmpl_name}' with operation 'iter.combination' has input spec '{name}' with negative 'inc' but 'start' ({start}) < 'end' ({end})")
 
                         # Generate range values
-                        values = []
-                        current = start
-                        if inc > 0:
-                            while current <= end:
-                                values.append(current)
-                                current += inc
-                        else:
-                            while current >= end:
-                                values.append(current)
-                                current += inc
+                        values = range_values(start, end, inc)
 
                         if not values:
                             logger.warning(f"Template '{tmpl_name}' with operation 'iter.combination' has input spec '{name}' with range that generated no values (start={start}, end={end}, inc={inc})")
 
-                        # Convert to int if whole numbers, otherwise keep as float
-                        values = [int(v) if v == int(v) else v for v in values]
                         input_sets.append(values)
                     else:
                         raise ValueError(f"Template '{tmpl_name}' with operation 'iter.combination' has input spec '{name}' missing 'class_name', 'values', or 'operation' field")
-                parent = get_template_parent()
+                tmpl_class = intern_name(tmpl['class'])
+                if ignores_whole_class(tmpl_class, ignore_class_dict):
+                    continue
+                pattern_name = tmpl['pattern']['name']
+                if isinstance(pattern_name, str):
+                    pattern_name = pattern_name.replace("${prefix}", tmpl.get('prefix', ''))
+                subset_lists = [subset_map.setdefault(subset, []) for subset in tmpl.get('subsets', [])]
+                parent = tuple(intern_name(p) for p in iter_parents(get_template_parent(tmpl_name, tmpl)))
+
+                # Scan each template string once, then only render per combination.
+                # Templates are compiled when first rendered, so a malformed one
+                # only fails if a combination actually uses it
+                name_segments = None
+                parent_segments = None
+                prop_segments = None
+
                 for combination in itertools.product(*input_sets):
-                    item_dict = dict(zip(names, combination))
                     try:
-                        instance_name = tmpl['pattern']['name'].replace("${prefix}", prefix)
-                        instance_name = process_combination_expr(instance_name, item_dict)
+                        if name_segments is None:
+                            name_segments = bind_combination_template(compile_combination_template(pattern_name), names)
+                        instance_name = intern_name(render_combination_values(name_segments, names, combination))
                     except Exception as e:
                         raise ValueError(f"Template '{tmpl_name}' failed to process pattern name: {e}")
-                    if should_ignore_class(tmpl['class'], instance_name, ignore_class_dict):
+                    if should_ignore_class(tmpl_class, instance_name, ignore_class_dict):
                         continue
-                    lines.append(f"\n{instance_name} class {tmpl['class']}")
-                    all_classes[instance_name] = tmpl['class']
+                    block = start_block(instance_name, tmpl_class)
+                    register_instance(instance_name, tmpl_class)
                     if not parent:
                         raise ValueError(f"Template '{tmpl_name}' with operation 'iter.combination' requires a parent (either in pattern or at top level)")
 
-                    resolved_parent = parent
-                    if isinstance(resolved_parent, str):
-                        resolved_parent = [resolved_parent]
-                    for p in resolved_parent:
+                    if parent_segments is None:
+                        parent_segments = []
+                        for p in parent:
+                            try:
+                                parent_segments.append(bind_combination_template(compile_combination_template(p), names))
+                            except Exception as e:
+                                raise ValueError(f"Template '{tmpl_name}' failed to process parent: {e}")
+                    for segments in parent_segments:
                         try:
-                            p = process_combination_expr(p, item_dict)
+                            p = render_combination_values(segments, names, combination)
                         except Exception as e:
                             raise ValueError(f"Template '{tmpl_name}' failed to process parent: {e}")
-                        lines.append(f"{instance_name} parent {p}")
+                        add_parent(instance_name, block, intern_name(p))
 
-                    if 'properties' in tmpl['pattern']:
-                        for prop_key, prop_val in tmpl['pattern']['properties'].items():
+                    if prop_segments is None:
+                        prop_segments = []
+                        for prop_key, prop_val in tmpl['pattern'].get('properties', {}).items():
                             try:
-                                val = process_combination_expr(str(prop_val), item_dict)
-                                # Find any other ${} references in the value and resolve them
-                                val = resolve_keys(val, keys)
+                                prop_segments.append((intern_name(prop_key), bind_combination_template(compile_combination_template(bind_keys(str(prop_val), keys, 'item:')), names)))
                             except Exception as e:
                                 raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}': {e}")
-                            lines.append(f"{instance_name} {prop_key} {val}")
-                    for subset in tmpl.get('subsets', []):
-                        subset_map.setdefault(subset, []).append(instance_name)
+                    for prop_key, segments in prop_segments:
+                        try:
+                            val = render_combination_values(segments, names, combination)
+                            # Find any other ${} references in the value and resolve them
+                            val = resolve(val)
+                        except Exception as e:
+                            raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}': {e}")
+                        block.append(f"{instance_name} {prop_key} {val}")
+                    for subset_list in subset_lists:
+                        subset_list.append(instance_name)
 
             elif operation == 'range':
                 validate_template_input(tmpl_name, tmpl, ['input', 'pattern', 'class'])
@@ -572,83 +1033,75 @@ def generate_meta(yaml_cfg, ignore_class=None):
                 if inc < 0 and start < end:
                     raise ValueError(f"Template '{tmpl_name}' with operation 'range' has negative 'inc' but 'start' ({start}) < 'end' ({end})")
 
-                parent = get_template_parent()
-                if isinstance(parent, str):
-                    parent = [parent]
+                tmpl_class = intern_name(tmpl['class'])
+                if ignores_whole_class(tmpl_class, ignore_class_dict):
+                    continue
+                pattern_name = tmpl['pattern']['name']
+                name_chunks = split_item_template(pattern_name)
+                prop_items = []
+                for prop_key, prop_val in tmpl['pattern'].get('properties', {}).items():
+                    prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
+                    prop_val_str = bind_keys(prop_val_str, keys)
+                    prop_items.append((intern_name(prop_key), prop_val_str, split_item_template(prop_val_str)))
+                subset_lists = [subset_map.setdefault(subset, []) for subset in tmpl.get('subsets', [])]
+                parent = tuple(intern_name(p) for p in iter_parents(get_template_parent(tmpl_name, tmpl)))
 
                 # Generate range values
-                values = []
-                current = start
-                if inc > 0:
-                    while current <= end:
-                        values.append(current)
-                        current += inc
-                else:
-                    while current >= end:
-                        values.append(current)
-                        current += inc
+                values = range_values(start, end, inc)
 
                 if not values:
                     logger.warning(f"Template '{tmpl_name}' with operation 'range' generated no values with start={start}, end={end}, inc={inc}")
 
                 # Process each value in the range
-                for value in values:
-                    # Convert to int if it's a whole number, otherwise keep as float
-                    item = int(value) if value == int(value) else value
+                duplicate_names = []
+                new_property_count = 0
+                for item in values:
                     try:
-                        instance_name = process_template_expr(tmpl['pattern']['name'], item)
+                        instance_name = intern_name(expand_item_template(pattern_name, name_chunks, item))
                     except Exception as e:
                         raise ValueError(f"Template '{tmpl_name}' failed to process range value {item}: {e}")
-                    if should_ignore_class(tmpl['class'], instance_name, ignore_class_dict):
+                    if should_ignore_class(tmpl_class, instance_name, ignore_class_dict):
                         continue
                     # Check if the instance name already exists and is the same class
                     is_duplicate = False
-                    if instance_name in all_classes and all_classes[instance_name] == tmpl['class']:
+                    if instance_name in all_classes and all_classes[instance_name] == tmpl_class:
                         is_duplicate = True
-                        logger.warning(f"Duplicate instance name: '{instance_name}' with class '{tmpl['class']}', will attempt to add new parents")
+                        duplicate_names.append(instance_name)
+                        block = instance_lines[instance_name]
                     else:
-                        lines.append(f"\n{instance_name} class {tmpl['class']}")
-                    if parent:
-                        for p in parent:
-                            if is_duplicate:
-                                lines.insert(class_last_line_idx[instance_name], f"{instance_name} parent {p}")
-                                class_last_line_idx[instance_name] += 1
-                            else:
-                                lines.append(f"{instance_name} parent {p}")
-                            all_parents[instance_name].add(p)
-                    if 'properties' in tmpl['pattern']:
-                        for prop_key, prop_val in tmpl['pattern']['properties'].items():
-                            try:
-                                prop_val_str = normalize_value(prop_val) if not isinstance(prop_val, str) else prop_val
-                                resolved_val = resolve_keys(process_template_expr(prop_val_str, item), keys)
-                            except Exception as e:
-                                raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}' for range value {item}: {e}")
-                            if is_duplicate:
-                                if prop_key in all_instance_properties[instance_name] and all_instance_properties[instance_name][prop_key] == resolved_val:
-                                    continue
-                                else:
-                                    logger.warning(f"Duplicate instance name: '{instance_name}' with class '{tmpl['class']}', will attempt to add new property")
-                                    lines.insert(class_last_line_idx[instance_name], f"{instance_name} {prop_key} {resolved_val}")
-                                    class_last_line_idx[instance_name] += 1
-                                    continue
-                            lines.append(f"{instance_name} {prop_key} {resolved_val}")
-                            all_instance_properties[instance_name][prop_key] = resolved_val
-                    if not is_duplicate:
-                        class_last_line_idx[instance_name] = len(lines)
-                    for subset in tmpl.get('subsets', []):
-                        subset_map.setdefault(subset, []).append(instance_name)
-                    all_classes[instance_name] = tmpl['class']
+                        block = start_block(instance_name, tmpl_class)
+                    for p in parent:
+                        add_parent(instance_name, block, p)
+                    instance_properties = all_instance_properties[instance_name]
+                    for prop_key, prop_val_str, prop_chunks in prop_items:
+                        try:
+                            resolved_val = resolve(expand_item_template(prop_val_str, prop_chunks, item))
+                        except Exception as e:
+                            raise ValueError(f"Template '{tmpl_name}' failed to process property '{prop_key}' for range value {item}: {e}")
+                        if is_duplicate:
+                            if instance_properties.get(prop_key) != resolved_val:
+                                new_property_count += 1
+                                block.append(f"{instance_name} {prop_key} {resolved_val}")
+                            continue
+                        block.append(f"{instance_name} {prop_key} {resolved_val}")
+                        instance_properties[prop_key] = resolved_val
+                    for subset_list in subset_lists:
+                        subset_list.append(instance_name)
+                    register_instance(instance_name, tmpl_class)
+                warn_duplicates(tmpl_name, tmpl_class, duplicate_names, new_property_count)
 
             else:
                 raise ValueError(f"Unsupported operation '{operation}' in template '{tmpl_name}'")
         except Exception as e:
             logger.error(f"Error processing template '{tmpl_name}': {e}")
             raise
-    return "\n".join(lines)
+    return itertools.chain(lines, (line for block in blocks for line in block))
 
 
 # Argparse interface
 def main():
+    import argparse
+
     parser = argparse.ArgumentParser(description="Generate meta file from YAML config")
     parser.add_argument("yaml", help="Path to input YAML config")
     parser.add_argument("output", help="Path to output meta file")
@@ -659,9 +1112,11 @@ def main():
 
     try:
         cfg = load_yaml(args.yaml)
-        meta_content = generate_meta(cfg, args.ignore_class)
-        with open(args.output, 'w') as f:
-            f.write(meta_content)
+        # Build everything before opening the output, so a config error
+        # leaves an existing output file untouched
+        all_lines = build_meta_lines(cfg, args.ignore_class)
+        with open(args.output, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            write_meta_lines(all_lines, f)
         logger.info(f"Meta file '{args.output}' generated successfully.")
     except Exception as e:
         logger.error(f"Error: {e}")
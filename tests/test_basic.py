@@ -1,8 +1,13 @@
 """
 Basic tests for core functionality.
 """
+import copy
+import io
+import os
+import sys
 import pytest
-from meta_sanity.generate_meta import generate_meta
+import yaml
+from meta_sanity.generate_meta import generate_meta, main
 
 
 class TestBasicGeneration:
@@ -117,6 +122,104 @@ class TestBasicGeneration:
         result = generate_meta(config)
         assert 'root_project class project' in result
 
+    def test_write_to_stream(self, basic_config_with_parent):
+        """Writing to an output stream should match the returned string."""
+        out = io.StringIO()
+
+        assert generate_meta(basic_config_with_parent, out=out) is None
+        assert out.getvalue() == generate_meta(basic_config_with_parent)
+
+    def test_config_is_not_modified(self, basic_config):
+        """Generation should leave the input config untouched."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['s1', 's2'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                    'properties': {
+                        'path': '${data_dir}/${item}',
+                    }
+                },
+                'parent': 'root_project',
+                'subsets': ['all']
+            },
+            'analyses': {
+                'class': 'analysis',
+                'operation': 'for_each_class',
+                'input': {
+                    'class_name': 'sample',
+                    'if_subset': ['all']
+                },
+                'pattern': {
+                    'name': 'analysis__${item}',
+                    'properties': {
+                        'target': '${item}',
+                    }
+                },
+                'parent': 'root_project'
+            }
+        }
+        snapshot = copy.deepcopy(config)
+
+        generate_meta(config)
+        assert config == snapshot
+
+
+class TestCommandLine:
+    """Test the generate-meta command line entry point."""
+
+    def run_main(self, monkeypatch, yaml_path, output_path):
+        monkeypatch.setattr(sys, 'argv', ['generate-meta', str(yaml_path), str(output_path)])
+        main()
+
+    def test_writes_output_file(self, monkeypatch, tmp_path, basic_config_with_parent, temp_output_file):
+        """The CLI should write the generated meta to the output path."""
+        yaml_path = tmp_path / 'config.yaml'
+        yaml_path.write_text(yaml.safe_dump(basic_config_with_parent, sort_keys=False))
+
+        self.run_main(monkeypatch, yaml_path, temp_output_file)
+        with open(temp_output_file, encoding='utf-8') as f:
+            assert f.read() == generate_meta(basic_config_with_parent)
+
+    def test_writes_through_symlinked_output(self, monkeypatch, tmp_path, basic_config_with_parent):
+        """A symlinked output path should write the link target, not replace the link."""
+        yaml_path = tmp_path / 'config.yaml'
+        yaml_path.write_text(yaml.safe_dump(basic_config_with_parent, sort_keys=False))
+        target = tmp_path / 'real.meta'
+        target.write_text('')
+        link = tmp_path / 'link.meta'
+        os.symlink(target, link)
+
+        self.run_main(monkeypatch, yaml_path, link)
+        assert link.is_symlink()
+        assert target.read_text(encoding='utf-8') == generate_meta(basic_config_with_parent)
+
+    def test_failed_run_keeps_existing_output(self, monkeypatch, tmp_path, basic_config):
+        """A config error should leave a pre-existing output file unchanged."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'broken': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a'],
+                'pattern': {
+                    'name': 'x_${item.nope()}',
+                },
+                'parent': 'root_project'
+            }
+        }
+        yaml_path = tmp_path / 'config.yaml'
+        yaml_path.write_text(yaml.safe_dump(config, sort_keys=False))
+        output_path = tmp_path / 'out.meta'
+        output_path.write_text('previous content')
+
+        with pytest.raises(SystemExit):
+            self.run_main(monkeypatch, yaml_path, output_path)
+        assert output_path.read_text() == 'previous content'
+
 
 class TestErrorMessages:
     """Test that error messages are helpful."""
@@ -33,6 +33,15 @@ class TestKeyResolution:
         with pytest.raises(ValueError, match="Undefined key: 'unknown'"):
             resolve_keys('${unknown}', keys)
 
+    def test_circular_reference_in_resolve_keys(self):
+        """Resolving against keys that reference each other should raise error."""
+        keys = {
+            'a': '${b}',
+            'b': '${a}',
+        }
+        with pytest.raises(ValueError, match="Circular key reference"):
+            resolve_keys('${a}', keys)
+
     def test_numeric_key_value(self):
         """Key values can be numeric."""
         keys = {
@@ -42,6 +51,57 @@ class TestKeyResolution:
         # Keys are resolved during key writing
         assert keys['port'] == 8080
 
+    def test_key_referencing_numeric_key(self, basic_config):
+        """Numeric key values can be referenced from other keys."""
+        config = basic_config.copy()
+        config['keys'] = {
+            'port': 8080,
+            'url': 'http://localhost:${port}',
+        }
+
+        result = generate_meta(config)
+        assert '!key port 8080' in result
+        assert '!key url http://localhost:8080' in result
+
+    def test_circular_key_reference(self, basic_config):
+        """Keys that reference each other in a cycle should raise error."""
+        config = basic_config.copy()
+        config['keys'] = {
+            'a': '${b}/x',
+            'b': '${a}/y',
+        }
+
+        with pytest.raises(ValueError, match="Circular key reference"):
+            generate_meta(config)
+
+    def test_template_property_mixing_keys_and_item(self, basic_config):
+        """Template properties can combine key and item references."""
+        config = basic_config.copy()
+        config['keys'] = {
+            'data_dir': '/data',
+            'ext': 'csv',
+        }
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['s1', 's2'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                    'properties': {
+                        'path': '${data_dir}/${item}.${ext}',
+                        'label': '${data_dir}/${item.upper()}',
+                    }
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert 'sample__s1 path /data/s1.csv' in result
+        assert 'sample__s2 path /data/s2.csv' in result
+        assert 'sample__s1 label /data/S1' in result
+
 
 class TestClassDefinitions:
     """Test class definition edge cases."""
@@ -293,6 +353,29 @@ class TestIgnoreClass:
         assert 'sample__control_1' not in result
         assert 'sample__control_2' not in result
 
+    def test_ignore_whole_class_skips_template_expansion(self, basic_config):
+        """Fully ignored classes should not have their templates expanded."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['s1'],
+                'pattern': {
+                    'name': 'sample__${item.missing()}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config, ignore_class=['sample'])
+        assert 'class sample' not in result
+
+    def test_ignore_class_with_invalid_pattern(self, basic_config):
+        """ignore-class with an invalid regex should raise helpful error."""
+        with pytest.raises(ValueError, match="Invalid regex pattern"):
+            generate_meta(basic_config, ignore_class=['sample:(unclosed'])
+
 
 class TestInvalidOperations:
     """Test invalid/unsupported operations."""
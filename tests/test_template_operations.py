@@ -52,6 +52,123 @@ class TestForEachItem:
         assert 'sample__a class sample' in result
         assert 'sample__b class sample' in result
 
+    def test_duplicate_item_adds_only_new_parents(self, basic_config):
+        """Duplicate instances should add new parents without repeating existing ones."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            },
+            'more_samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                    'parent': ['root_project', 'other_parent'],
+                },
+            }
+        }
+
+        result = generate_meta(config)
+        assert result.count('sample__a class sample') == 1
+        assert result.count('sample__a parent root_project') == 1
+        assert 'sample__a parent other_parent' in result
+
+    def test_duplicate_items_keep_lines_in_own_block(self, basic_config):
+        """Values merged from a second template should stay inside each instance's block."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a', 'b'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                    'properties': {
+                        'source': 'first',
+                    }
+                },
+                'parent': 'root_project'
+            },
+            'more_samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a', 'b'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                    'properties': {
+                        'source': 'second',
+                    }
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        blocks = {block.split(' ', 1)[0]: block.splitlines() for block in result.split('\n\n')[1:]}
+        assert blocks['sample__a'] == [
+            'sample__a class sample',
+            'sample__a parent root_project',
+            'sample__a source first',
+            'sample__a source second',
+        ]
+        assert blocks['sample__b'] == [
+            'sample__b class sample',
+            'sample__b parent root_project',
+            'sample__b source first',
+            'sample__b source second',
+        ]
+
+    def test_duplicate_items_warn_once_per_template(self, basic_config, caplog):
+        """Duplicates should be summarized in one warning per template."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            },
+            'more_samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            },
+            'extra_samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        with caplog.at_level('WARNING', logger='meta_sanity.generate_meta'):
+            generate_meta(config)
+
+        warnings = [record.getMessage() for record in caplog.records if record.levelname == 'WARNING']
+        assert len(warnings) == 2
+        assert "Template 'more_samples' produced 7 duplicate instance name(s)" in warnings[0]
+        assert "('sample__a', 'sample__b', 'sample__c', 'sample__d', 'sample__e' and 2 more)" in warnings[0]
+        assert "Template 'extra_samples' produced 1 duplicate instance name(s)" in warnings[1]
+        assert "('sample__a')" in warnings[1]
+
     def test_for_each_item_missing_input(self, basic_config):
         """Missing input field should raise helpful error."""
         config = basic_config.copy()
@@ -197,6 +314,47 @@ class TestForEachClass:
         assert 'analysis__sample__s1 class analysis' in result
         assert 'analysis__sample__s2 class analysis' in result
 
+    def test_for_each_class_keeps_first_registration_order(self, basic_config):
+        """An instance re-registered under another class keeps its original position."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'controls': {
+                'class': 'control',
+                'operation': 'for_each_item',
+                'input': ['b'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            },
+            'samples': {
+                'class': 'sample',
+                'operation': 'for_each_item',
+                'input': ['a', 'b'],
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            },
+            'analyses': {
+                'class': 'analysis',
+                'operation': 'for_each_class',
+                'input': {
+                    'class_name': 'sample',
+                },
+                'pattern': {
+                    'name': 'analysis__${item}',
+                    'properties': {
+                        'target': '${item}',
+                    }
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert result.index('analysis__sample__b class analysis') < result.index('analysis__sample__a class analysis')
+
     def test_for_each_class_missing_class_name(self, basic_config):
         """Missing class_name in input should raise error."""
         config = basic_config.copy()
@@ -332,6 +490,58 @@ class TestIterCombination:
         with pytest.raises(ValueError, match="empty 'input' list"):
             generate_meta(config)
 
+    def test_iter_combination_malformed_template_without_combinations(self, basic_config):
+        """A malformed template should not fail when no combination renders it."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'experiments': {
+                'class': 'experiment',
+                'operation': 'iter.combination',
+                'input': [
+                    {
+                        'name': 'temp',
+                        'values': []
+                    }
+                ],
+                'pattern': {
+                    'name': 'exp__${item:temp',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert 'class experiment' not in result
+
+    def test_iter_combination_malformed_property_of_ignored_instances(self, basic_config):
+        """A malformed property should not fail when every instance is ignored."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'experiments': {
+                'class': 'experiment',
+                'operation': 'iter.combination',
+                'input': [
+                    {
+                        'name': 'temp',
+                        'values': ['4c', '22c']
+                    }
+                ],
+                'pattern': {
+                    'name': 'exp__${item:temp}',
+                    'properties': {
+                        'temperature': '${item:temp',
+                    }
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config, ignore_class=['experiment:exp__.*c'])
+        assert 'class experiment' not in result
+
+        with pytest.raises(ValueError, match="failed to process property 'temperature'"):
+            generate_meta(config)
+
 
 class TestRange:
     """Test range template operation."""
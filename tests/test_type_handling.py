@@ -89,6 +89,17 @@ class TestProcessTemplateExpr:
         with pytest.raises(ValueError, match="Failed to evaluate"):
             process_template_expr("sample__${item.nonexistent_method()}", "test")
 
+    def test_expression_cannot_modify_builtins(self):
+        """Expressions must not be able to change built-ins for later evaluations."""
+        with pytest.raises(ValueError, match="Failed to evaluate"):
+            process_template_expr("${__builtins__.pop('len') and item}", "abc")
+        assert process_template_expr("${len(item)}", "abc") == "3"
+
+    def test_expression_syntax_error(self):
+        """Malformed Python expression should raise an error."""
+        with pytest.raises(ValueError, match="Failed to evaluate"):
+            process_template_expr("sample__${item +}", "test")
+
 
 class TestTemplateWithNumericValues:
     """Test templates with numeric input values."""
@@ -268,6 +279,104 @@ class TestRangeWithTypes:
         assert 'sample__1 class sample' in result  # 1.0 becomes 1
         assert 'sample__1.5 class sample' in result
 
+    def test_range_fractional_inc_reaches_end(self, basic_config):
+        """Fractional increments should not drift past the end value."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'fractions': {
+                'class': 'sample',
+                'operation': 'range',
+                'input': {
+                    'start': 0.1,
+                    'end': 1.0,
+                    'inc': 0.1,
+                },
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert result.count('class sample') == 10
+        assert 'sample__0.3 class sample' in result
+        assert 'sample__1 class sample' in result
+        assert '0.30000000000000004' not in result
+
+    def test_range_tiny_inc_keeps_every_value(self, basic_config):
+        """Increments far below 1e-12 should still produce distinct values."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'tiny': {
+                'class': 'sample',
+                'operation': 'range',
+                'input': {
+                    'start': 0,
+                    'end': 5e-13,
+                    'inc': 1e-13,
+                },
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert result.count('class sample') == 6
+        assert 'sample__0 class sample' in result
+        assert 'sample__1e-13 class sample' in result
+        assert 'sample__5e-13 class sample' in result
+
+    def test_range_high_precision_start(self, basic_config):
+        """Range values should keep every digit of a high-precision start."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'precise': {
+                'class': 'sample',
+                'operation': 'range',
+                'input': {
+                    'start': 0.1234567890123456,
+                    'end': 0.2,
+                    'inc': 0.05,
+                },
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert 'sample__0.1234567890123456 class sample' in result
+        assert 'sample__0.1734567890123456 class sample' in result
+
+    def test_range_whole_inc_stops_before_fractional_end(self, basic_config):
+        """Whole-number ranges should stop at the last value not past a fractional end."""
+        config = basic_config.copy()
+        config['templates'] = {
+            'countdown': {
+                'class': 'sample',
+                'operation': 'range',
+                'input': {
+                    'start': 5,
+                    'end': 1.5,
+                    'inc': -1,
+                },
+                'pattern': {
+                    'name': 'sample__${item}',
+                },
+                'parent': 'root_project'
+            }
+        }
+
+        result = generate_meta(config)
+        assert result.count('class sample') == 4
+        assert 'sample__5 class sample' in result
+        assert 'sample__2 class sample' in result
+        assert 'sample__1 class sample' not in result
+
     def test_range_with_string_numbers(self, basic_config):
         """Range should handle string numbers in YAML."""
         config = basic_config.copy()